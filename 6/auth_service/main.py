@@ -1,189 +1,662 @@
-from fastapi import FastAPI, HTTPException, Depends, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel, validator, Field
-from typing import Optional
-from datetime import datetime, timedelta
-import jwt
-import os
-import bcrypt
-import logging
-import re
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from enum import Enum
-import redis
-import json
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secure-secret-key-with-at-least-32-chars")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
-MASTER_USERNAME = os.getenv("MASTER_USERNAME", "admin")
-MASTER_PASSWORD = os.getenv("MASTER_PASSWORD", "secret")
-REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
-DB_CONFIG = {
-    "dbname": "task_tracker",
-    "user": "postgres",
-    "password": "postgres",
-    "host": "postgres",
-    "port": "5432"
-}
-
-# Инициализация Redis
-redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
-
-class Role(str, Enum):
-    CLIENT = "client"
-    ADMIN = "admin"
-    EXECUTOR = "executor"
-
-class UserBase(BaseModel):
-    username: str = Field(..., min_length=3, max_length=50, pattern="^[a-zA-Z0-9_]+$")
-    full_name: Optional[str] = Field(None, max_length=100)
-    role: Role = Role.CLIENT
-
-    @validator('username')
-    def validate_username(cls, v):
-        if not re.match("^[a-zA-Z0-9_]+$", v):
-            raise ValueError("Username can only contain letters, numbers and underscores")
-        return v
-
-class UserCreate(UserBase):
-    password: str = Field(..., min_length=8)
-
-class UserInDB(UserBase):
-    user_id: int
-    hashed_password: str
-    disabled: bool = False
-
-class UserPublic(UserBase):
-    user_id: int
-
-class Token(BaseModel):
-    access_token: str
-    token_type: str
-
-app = FastAPI()
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
-
-def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
-
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
-
-def get_user_by_username(username: str) -> Optional[UserInDB]:
-    # Проверяем кэш
-    cached_user = redis_client.get(f"user:username:{username}")
-    if cached_user:
-        logger.info(f"Cache hit for username: {username}")
-        return UserInDB(**json.loads(cached_user))
-
-    # Если в кэше нет, идем в базу
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT * FROM users WHERE username = %s", (username,))
-            user = cur.fetchone()
-            if user:
-                # Сохраняем в кэш
-                user_data = UserInDB(**user).dict()
-                redis_client.setex(f"user:username:{username}", 3600, json.dumps(user_data))
-                logger.info(f"Cache miss for username: {username}, stored in cache")
-                return UserInDB(**user)
-            return None
-
-def get_user_by_id(user_id: int) -> Optional[UserInDB]:
-    # Проверяем кэш
-    cached_user = redis_client.get(f"user:id:{user_id}")
-    if cached_user:
-        logger.info(f"Cache hit for user_id: {user_id}")
-        return UserInDB(**json.loads(cached_user))
-
-    # Если в кэше нет, идем в базу
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
-            user = cur.fetchone()
-            if user:
-                # Сохраняем в кэш
-                user_data = UserInDB(**user).dict()
-                redis_client.setex(f"user:id:{user_id}", 3600, json.dumps(user_data))
-                logger.info(f"Cache miss for user_id: {user_id}, stored in cache")
-                return UserInDB(**user)
-            return None
-
-def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
-    user = get_user_by_username(username)
-    if not user or not verify_password(password, user.hashed_password):
-        return None
-    return user
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        user = get_user_by_id(int(user_id))
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
-    except jwt.PyJWTError:
-        raise HTTPException(status_code=401, detail="Could not validate credentials")
-
-@app.post("/auth/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
-    if not user:
-        raise HTTPException(status_code=401, detail="Incorrect username or password")
-    access_token = create_access_token(
-        data={"sub": str(user.user_id)},
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
-
-@app.get("/auth/users/me", response_model=UserPublic)
-async def read_users_me(current_user: UserInDB = Depends(get_current_user)):
-    return current_user
-
-@app.post("/auth/users/", response_model=UserPublic)
-async def create_user(user: UserCreate):
-    if get_user_by_username(user.username):
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    hashed_password = hash_password(user.password)
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO users (username, full_name, role, hashed_password) VALUES (%s, %s, %s, %s) RETURNING user_id",
-                (user.username, user.full_name, user.role.value, hashed_password)
-            )
-            user_id = cur.fetchone()[0]
-            conn.commit()
-            
-            # После создания пользователя получаем его данные
-            cur.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
-            new_user = cur.fetchone()
-            user_data = UserInDB(**new_user).dict()
-            # Сохраняем в кэш (write-through)
-            redis_client.setex(f"user:username:{user.username}", 3600, json.dumps(user_data))
-            redis_client.setex(f"user:id:{user_id}", 3600, json.dumps(user_data))
-            logger.info(f"User {user.username} created and cached")
-    
-    return UserPublic(user_id=user_id, username=user.username, full_name=user.full_name, role=user.role)
-
-if __name__ == "__main__":
-    import uvicorn
+from fastapi import FastAPI, HTTPException, Depends, status, Response
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from pydantic import BaseModel, validator, Field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import asyncio
+import jwt
+import os
+import bcrypt
+import logging
+import math
+import random
+import re
+import secrets
+import time
+from psycopg.conninfo import make_conninfo
+from psycopg.errors import UniqueViolation
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from enum import Enum
+import redis.asyncio as aioredis
+import json
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secure-secret-key-with-at-least-32-chars")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+MASTER_USERNAME = os.getenv("MASTER_USERNAME", "admin")
+MASTER_PASSWORD = os.getenv("MASTER_PASSWORD", "secret")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+DB_CONFIG = {
+    "dbname": "task_tracker",
+    "user": "postgres",
+    "password": "postgres",
+    "host": "postgres",
+    "port": "5432"
+}
+
+# Пул соединений PostgreSQL
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "2"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "20"))
+PG_POOL_MAX_IDLE = float(os.getenv("PG_POOL_MAX_IDLE", "300"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "5"))
+
+# Пул потоков для bcrypt; по умолчанию ядра делятся поровну между воркерами gunicorn
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+BCRYPT_POOL_SIZE = int(os.getenv("BCRYPT_POOL_SIZE", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))
+
+# Кэш пользователей в Redis (ключи user:username:* и user:id:*)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "3600"))
+
+# Локальный (в памяти процесса) кэш пользователей перед Redis для get_user_by_id
+LOCAL_USER_CACHE_SIZE = int(os.getenv("LOCAL_USER_CACHE_SIZE", "10000"))
+LOCAL_USER_CACHE_TTL = float(os.getenv("LOCAL_USER_CACHE_TTL", "5"))
+
+# Защита от «стада» при истечении ключей кэша пользователей
+USER_CACHE_TTL_JITTER = float(os.getenv("USER_CACHE_TTL_JITTER", "0.1"))
+USER_CACHE_EARLY_REFRESH_BETA = float(os.getenv("USER_CACHE_EARLY_REFRESH_BETA", "1.0"))
+USER_CACHE_LOCK_TIMEOUT_MS = int(os.getenv("USER_CACHE_LOCK_TIMEOUT_MS", "3000"))
+USER_CACHE_LOCK_POLL_MS = int(os.getenv("USER_CACHE_LOCK_POLL_MS", "50"))
+
+# Негативный кэш: несуществующие пользователи запоминаются ненадолго, чтобы
+# перебор логинов не доходил до PostgreSQL
+USER_NEGATIVE_CACHE_TTL = int(os.getenv("USER_NEGATIVE_CACHE_TTL", "30"))
+USER_NOT_FOUND = "not_found"
+
+# Как часто счетчики из словарей статистики переносятся в метрики Prometheus, с
+METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", "5"))
+
+class Role(str, Enum):
+    CLIENT = "client"
+    ADMIN = "admin"
+    EXECUTOR = "executor"
+
+class UserBase(BaseModel):
+    username: str = Field(..., min_length=3, max_length=50, pattern="^[a-zA-Z0-9_]+$")
+    full_name: Optional[str] = Field(None, max_length=100)
+    role: Role = Role.CLIENT
+
+    @validator('username')
+    def validate_username(cls, v):
+        if not re.match("^[a-zA-Z0-9_]+$", v):
+            raise ValueError("Username can only contain letters, numbers and underscores")
+        return v
+
+class UserCreate(UserBase):
+    password: str = Field(..., min_length=8)
+
+class UserInDB(UserBase):
+    user_id: int
+    hashed_password: str
+    disabled: bool = False
+
+class UserPublic(UserBase):
+    user_id: int
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+
+class LocalCache:
+    """LRU-кэш в памяти процесса с коротким временем жизни записей.
+
+    Пользователи после создания не меняются, поэтому записи устаревают только по TTL;
+    если появится изменение пользователя, репликам понадобится инвалидация.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry and entry[1] > time.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+        if entry:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+local_user_cache = LocalCache(LOCAL_USER_CACHE_SIZE, LOCAL_USER_CACHE_TTL)
+
+# Метрики Prometheus. Под gunicorn (задан PROMETHEUS_MULTIPROC_DIR) каждый воркер пишет
+# значения в свои файлы, а /metrics собирает их со всех воркеров
+if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    # Вне gunicorn (python -m auth_service.main) каталог никто не создал; см. gunicorn.conf.py
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+BACKEND_LATENCY = Histogram(
+    "backend_operation_duration_seconds", "Время обращения к внешним системам",
+    ["backend", "operation"], buckets=LATENCY_BUCKETS
+)
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Обращения к кэшам по результату", ["cache", "result"])
+CACHE_EVENTS = Counter("cache_events_total", "Вытеснения, негативные записи и защита от «стада»", ["cache", "event"])
+POOL_EVENTS = Counter("pool_events_total", "События пулов соединений и потоков", ["pool", "event"])
+POOL_WAIT = Counter("pool_wait_seconds_total", "Суммарное ожидание соединения из пула", ["pool"])
+POOL_CONNECTIONS = Gauge("pool_connections", "Соединения пулов по состоянию", ["pool", "state"], multiprocess_mode="livesum")
+
+def backend_timer(backend: str, operation: str):
+    return BACKEND_LATENCY.labels(backend, operation).time()
+
+def metrics_registry():
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+class MetricsMiddleware:
+    """ASGI-middleware: время каждого запроса по шаблону маршрута и коду ответа."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], route.path if route else "unmatched", str(status_code)
+            ).observe(time.perf_counter() - started)
+
+class StatsExporter:
+    """Переносит счетчики из словарей статистики (/internal/stats) в метрики Prometheus.
+
+    Счетчики увеличиваются на прирост с прошлого вызова, поэтому горячий путь
+    по-прежнему меняет только словари. Вызывается фоновым циклом и перед каждым /metrics.
+    """
+
+    def __init__(self, counters: list, gauges: list):
+        self.counters = counters
+        self.gauges = gauges
+        self._last = [0] * len(counters)
+
+    def export(self):
+        for i, (counter, read) in enumerate(self.counters):
+            value = read()
+            if value > self._last[i]:
+                counter.inc(value - self._last[i])
+            self._last[i] = value
+        for gauge, read in self.gauges:
+            gauge.set(read())
+
+# Пулы живут все время работы процесса; создаются и проверяются в lifespan
+# каждого воркера, поэтому ничего не разделяется между процессами после fork
+db_pool: Optional[AsyncConnectionPool] = None
+redis_pool: Optional[aioredis.ConnectionPool] = None
+redis_client: Optional[aioredis.Redis] = None
+bcrypt_executor: Optional[ThreadPoolExecutor] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global db_pool, redis_pool, redis_client, bcrypt_executor
+    # bcrypt отпускает GIL, поэтому хэширование в потоках не блокирует event loop
+    bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_POOL_SIZE, thread_name_prefix="bcrypt")
+    redis_pool = aioredis.ConnectionPool.from_url(
+        REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS, decode_responses=True
+    )
+    redis_client = aioredis.Redis(connection_pool=redis_pool)
+    db_pool = AsyncConnectionPool(
+        make_conninfo(**DB_CONFIG),
+        min_size=PG_POOL_MIN_SIZE,
+        max_size=PG_POOL_MAX_SIZE,
+        max_idle=PG_POOL_MAX_IDLE,
+        timeout=PG_POOL_TIMEOUT,
+        open=False
+    )
+    await db_pool.open(wait=True, timeout=PG_POOL_TIMEOUT)
+    # Проверяем, что база доступна, до того как начнем принимать запросы
+    async with db_pool.connection() as conn:
+        await conn.execute("SELECT 1")
+    logger.info(f"PostgreSQL pool ready (min={PG_POOL_MIN_SIZE}, max={PG_POOL_MAX_SIZE})")
+    stats_export = asyncio.create_task(export_stats_loop())
+    try:
+        yield
+    finally:
+        stats_export.cancel()
+        await db_pool.close()
+        db_pool = None
+        await redis_client.aclose()
+        await redis_pool.disconnect()
+        redis_client = None
+        redis_pool = None
+        bcrypt_executor.shutdown(wait=False)
+        bcrypt_executor = None
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
+
+def get_db_connection():
+    return db_pool.connection()
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+bcrypt_stats = {
+    "in_flight": 0,
+    "completed": 0,
+    "rejected": 0
+}
+
+async def run_bcrypt(func, *args):
+    # Если пул и очередь заполнены, сразу отвечаем 503, а не копим ожидающие запросы
+    if bcrypt_stats["in_flight"] >= BCRYPT_POOL_SIZE + BCRYPT_MAX_QUEUE:
+        bcrypt_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, try again later",
+            headers={"Retry-After": "1"}
+        )
+    bcrypt_stats["in_flight"] += 1
+    try:
+        # Включая ожидание в очереди пула: именно его видит клиент
+        with backend_timer("bcrypt", func.__name__):
+            return await asyncio.get_running_loop().run_in_executor(bcrypt_executor, func, *args)
+    finally:
+        bcrypt_stats["in_flight"] -= 1
+        bcrypt_stats["completed"] += 1
+
+def user_cache_keys(user: UserInDB) -> Tuple[str, str]:
+    return f"user:username:{user.username}", f"user:id:{user.user_id}"
+
+# Снимает блокировку, только если она все еще наша (могла истечь и достаться другому процессу)
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+stampede_stats = {
+    "coalesced": 0,
+    "lock_acquired": 0,
+    "lock_waits": 0,
+    "lock_wait_timeouts": 0,
+    "lock_released_empty": 0,
+    "early_refreshes": 0
+}
+inflight_loads: Dict[str, "asyncio.Task"] = {}
+background_refreshes = set()
+
+user_cache_stats = {
+    "hits": 0,
+    "misses": 0
+}
+negative_cache_stats = {
+    "hits": 0,
+    "stores": 0
+}
+
+def jittered_ttl() -> int:
+    # Разброс TTL, чтобы ключи, закэшированные одновременно (например, после рестарта), не истекали разом
+    return max(1, int(USER_CACHE_TTL * random.uniform(1 - USER_CACHE_TTL_JITTER, 1 + USER_CACHE_TTL_JITTER)))
+
+async def cache_user(user: UserInDB, delta: float = 0.0):
+    # Оба ключа пишутся одной транзакцией MULTI/EXEC — один round-trip вместо двух.
+    # delta (время загрузки из базы) и expires_at нужны для вероятностного раннего обновления
+    ttl = jittered_ttl()
+    entry = json.dumps({"data": user.dict(), "delta": delta, "expires_at": time.time() + ttl})
+    pipe = redis_client.pipeline(transaction=True)
+    for key in user_cache_keys(user):
+        pipe.setex(key, ttl, entry)
+    with backend_timer("redis", "cache_user"):
+        await pipe.execute()
+
+async def cache_missing_user(key: str):
+    if USER_NEGATIVE_CACHE_TTL <= 0:
+        return
+    # NX: если пользователя успели создать и закэшировать, пока мы читали базу,
+    # метка «не найден» не должна затереть настоящую запись
+    with backend_timer("redis", "cache_missing_user"):
+        stored = await redis_client.set(key, USER_NOT_FOUND, ex=USER_NEGATIVE_CACHE_TTL, nx=True)
+    if stored:
+        negative_cache_stats["stores"] += 1
+
+def should_refresh_early(entry: dict) -> bool:
+    # XFetch: чем ближе истечение и чем дороже загрузка, тем выше шанс обновить ключ заранее
+    expires_at = entry.get("expires_at")
+    if expires_at is None:
+        return False
+    delta = entry.get("delta", 0.0)
+    return time.time() - delta * USER_CACHE_EARLY_REFRESH_BETA * math.log(1.0 - random.random()) >= expires_at
+
+def unwrap_cached_user(cached: str) -> Tuple[UserInDB, dict]:
+    entry = json.loads(cached)
+    # Записи старого формата — просто словарь пользователя
+    data = entry["data"] if "data" in entry else entry
+    return UserInDB(**data), entry
+
+async def fetch_user(column: str, value) -> Optional[UserInDB]:
+    # column подставляется только из кода (username или user_id), не из запроса
+    with backend_timer("postgres", f"select_user_by_{column}"):
+        async with get_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(f"SELECT * FROM users WHERE {column} = %s", (value,))
+                user = await cur.fetchone()
+    return UserInDB(**user) if user else None
+
+async def load_and_cache_user(key: str, column: str, value) -> Optional[UserInDB]:
+    # Заполняем сразу оба ключа: следующий поиск по другому ключу
+    # (например, /auth/users/me после логина) тоже попадет в кэш
+    started = time.monotonic()
+    user = await fetch_user(column, value)
+    if user:
+        await cache_user(user, time.monotonic() - started)
+    else:
+        await cache_missing_user(key)
+    return user
+
+async def single_flight(key: str, loader: Callable[[], Awaitable[Optional[UserInDB]]]) -> Optional[UserInDB]:
+    # Одновременные промахи по одному ключу в процессе ждут одну и ту же загрузку
+    task = inflight_loads.get(key)
+    if task:
+        stampede_stats["coalesced"] += 1
+    else:
+        task = asyncio.ensure_future(loader())
+        inflight_loads[key] = task
+        task.add_done_callback(lambda _: inflight_loads.pop(key, None))
+    return await asyncio.shield(task)
+
+async def load_user_locked(key: str, column: str, value) -> Optional[UserInDB]:
+    # Между процессами и репликами базу читает только владелец короткой блокировки,
+    # остальные ждут, пока он заполнит кэш
+    lock_key = f"lock:{key}"
+    token = secrets.token_hex(8)
+    with backend_timer("redis", "lock"):
+        acquired = await redis_client.set(lock_key, token, nx=True, px=USER_CACHE_LOCK_TIMEOUT_MS)
+    if acquired:
+        stampede_stats["lock_acquired"] += 1
+        try:
+            return await load_and_cache_user(key, column, value)
+        finally:
+            await redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+    stampede_stats["lock_waits"] += 1
+    deadline = time.monotonic() + USER_CACHE_LOCK_TIMEOUT_MS / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(USER_CACHE_LOCK_POLL_MS / 1000)
+        # Кэш и блокировка одним MGET
+        cached, lock_owner = await redis_client.mget(key, lock_key)
+        if cached == USER_NOT_FOUND:
+            # Владелец блокировки выяснил, что пользователя нет
+            negative_cache_stats["hits"] += 1
+            return None
+        if cached:
+            return unwrap_cached_user(cached)[0]
+        if lock_owner is None:
+            # Блокировку сняли, а кэш пуст: владелец упал или ничего не закэшировал
+            # (например, USER_NEGATIVE_CACHE_TTL=0) — ждать дальше нечего
+            stampede_stats["lock_released_empty"] += 1
+            return await load_and_cache_user(key, column, value)
+    # Владелец блокировки не успел — читаем базу сами
+    stampede_stats["lock_wait_timeouts"] += 1
+    return await load_and_cache_user(key, column, value)
+
+async def refresh_user_early(key: str, column: str, value):
+    lock_key = f"lock:{key}"
+    token = secrets.token_hex(8)
+    # Если ключ уже обновляет кто-то другой, просто пропускаем
+    if not await redis_client.set(lock_key, token, nx=True, px=USER_CACHE_LOCK_TIMEOUT_MS):
+        return
+    try:
+        stampede_stats["early_refreshes"] += 1
+        await load_and_cache_user(key, column, value)
+    except Exception as e:
+        logger.error(f"Early refresh of {key} failed: {str(e)}")
+    finally:
+        await redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+async def get_cached_user(key: str, column: str, value) -> Optional[UserInDB]:
+    # Проверяем кэш
+    with backend_timer("redis", "get_user"):
+        cached_user = await redis_client.get(key)
+    # Попадания и промахи считаются в статистике и метриках; в лог — только на уровне debug
+    if cached_user == USER_NOT_FOUND:
+        logger.debug(f"Negative cache hit for {key}")
+        negative_cache_stats["hits"] += 1
+        return None
+    if cached_user:
+        logger.debug(f"Cache hit for {key}")
+        user_cache_stats["hits"] += 1
+        user, entry = unwrap_cached_user(cached_user)
+        refresh_key = f"refresh:{key}"
+        if should_refresh_early(entry) and refresh_key not in inflight_loads:
+            # Отвечаем закэшированным значением, а ключ обновляем в фоне до его истечения
+            task = asyncio.ensure_future(single_flight(refresh_key, lambda: refresh_user_early(key, column, value)))
+            background_refreshes.add(task)
+            task.add_done_callback(background_refreshes.discard)
+        return user
+
+    logger.debug(f"Cache miss for {key}")
+    user_cache_stats["misses"] += 1
+    return await single_flight(key, lambda: load_user_locked(key, column, value))
+
+async def get_user_by_username(username: str) -> Optional[UserInDB]:
+    return await get_cached_user(f"user:username:{username}", "username", username)
+
+async def get_user_by_id(user_id: int) -> Optional[UserInDB]:
+    # Первый уровень — память процесса: без обращения к Redis, разбора JSON и создания модели
+    user = local_user_cache.get(user_id)
+    if user:
+        return user
+    user = await get_cached_user(f"user:id:{user_id}", "user_id", user_id)
+    if user:
+        local_user_cache.set(user_id, user)
+    return user
+
+async def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
+    user = await get_user_by_username(username)
+    if not user or not await run_bcrypt(verify_password, password, user.hashed_password):
+        return None
+    return user
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("sub")
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        user = await get_user_by_id(int(user_id))
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        return user
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+@app.post("/auth/token", response_model=Token)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await authenticate_user(form_data.username, form_data.password)
+    if not user:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    access_token = create_access_token(
+        data={
+            "sub": str(user.user_id),
+            "username": user.username,
+            "full_name": user.full_name,
+            "role": user.role.value
+        },
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@app.get("/auth/users/me", response_model=UserPublic)
+async def read_users_me(current_user: UserInDB = Depends(get_current_user)):
+    return current_user
+
+@app.post("/auth/users/", response_model=UserPublic)
+async def create_user(user: UserCreate):
+    # Закэшированный пользователь отсекается одним GET, до bcrypt. Без блокировки и метки
+    # «не найден»: окончательно дубликат ловит UNIQUE на users.username
+    with backend_timer("redis", "get_user"):
+        cached_user = await redis_client.get(f"user:username:{user.username}")
+    if cached_user and cached_user != USER_NOT_FOUND:
+        raise HTTPException(status_code=400, detail="Username already registered")
+    
+    hashed_password = await run_bcrypt(hash_password, user.password)
+    try:
+        with backend_timer("postgres", "insert_user"):
+            async with get_db_connection() as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    # RETURNING * сразу отдает созданную запись — отдельный SELECT не нужен
+                    await cur.execute(
+                        "INSERT INTO users (username, full_name, role, hashed_password) VALUES (%s, %s, %s, %s) RETURNING *",
+                        (user.username, user.full_name, user.role.value, hashed_password)
+                    )
+                    new_user = UserInDB(**(await cur.fetchone()))
+                    await conn.commit()
+    except UniqueViolation:
+        raise HTTPException(status_code=400, detail="Username already registered")
+
+    # Сохраняем в кэш (write-through); SETEX заодно затирает метку «не найден», если она была
+    await cache_user(new_user)
+    logger.info(f"User {user.username} created and cached")
+    
+    return UserPublic(user_id=new_user.user_id, username=user.username, full_name=user.full_name, role=user.role)
+
+def pg_stat(key: str) -> int:
+    # psycopg_pool не возвращает нулевые счетчики
+    return db_pool.get_stats().get(key, 0) if db_pool is not None else 0
+
+def redis_pool_connections(state: str) -> int:
+    if redis_pool is None:
+        return 0
+    return len(redis_pool._in_use_connections if state == "in_use" else redis_pool._available_connections)
+
+stats_exporter = StatsExporter(
+    counters=[
+        (CACHE_LOOKUPS.labels("local_user", "hit"), lambda: local_user_cache.hits),
+        (CACHE_LOOKUPS.labels("local_user", "miss"), lambda: local_user_cache.misses),
+        (CACHE_EVENTS.labels("local_user", "eviction"), lambda: local_user_cache.evictions),
+        (CACHE_LOOKUPS.labels("user", "hit"), lambda: user_cache_stats["hits"]),
+        (CACHE_LOOKUPS.labels("user", "miss"), lambda: user_cache_stats["misses"]),
+        (CACHE_LOOKUPS.labels("user", "negative_hit"), lambda: negative_cache_stats["hits"]),
+        (CACHE_EVENTS.labels("user", "negative_store"), lambda: negative_cache_stats["stores"]),
+        *[
+            (CACHE_EVENTS.labels("user", event), lambda event=event: stampede_stats[event])
+            for event in stampede_stats
+        ],
+        (POOL_EVENTS.labels("postgres", "requests"), lambda: pg_stat("requests_num")),
+        (POOL_EVENTS.labels("postgres", "queued"), lambda: pg_stat("requests_queued")),
+        (POOL_EVENTS.labels("postgres", "errors"), lambda: pg_stat("requests_errors")),
+        (POOL_WAIT.labels("postgres"), lambda: pg_stat("requests_wait_ms") / 1000),
+        (POOL_EVENTS.labels("bcrypt", "completed"), lambda: bcrypt_stats["completed"]),
+        (POOL_EVENTS.labels("bcrypt", "rejected"), lambda: bcrypt_stats["rejected"])
+    ],
+    gauges=[
+        (POOL_CONNECTIONS.labels("postgres", "size"), lambda: pg_stat("pool_size")),
+        (POOL_CONNECTIONS.labels("postgres", "available"), lambda: pg_stat("pool_available")),
+        (POOL_CONNECTIONS.labels("postgres", "waiting"), lambda: pg_stat("requests_waiting")),
+        (POOL_CONNECTIONS.labels("redis", "in_use"), lambda: redis_pool_connections("in_use")),
+        (POOL_CONNECTIONS.labels("redis", "idle"), lambda: redis_pool_connections("idle")),
+        (POOL_CONNECTIONS.labels("bcrypt", "in_flight"), lambda: bcrypt_stats["in_flight"])
+    ]
+)
+
+async def export_stats_loop():
+    while True:
+        await asyncio.sleep(METRICS_EXPORT_INTERVAL)
+        try:
+            stats_exporter.export()
+        except Exception as e:
+            logger.error(f"Не удалось обновить метрики: {str(e)}")
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    # Свежие значения этого воркера; остальные воркеры обновляют свои в фоне
+    stats_exporter.export()
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/internal/stats", include_in_schema=False)
+async def read_stats():
+    # Статистика одного воркера — того, что обработал запрос
+    return {
+        "worker_pid": os.getpid(),
+        "postgres_pool": db_pool.get_stats(),
+        "local_user_cache": local_user_cache.stats(),
+        "user_cache": user_cache_stats,
+        "user_cache_stampede": stampede_stats,
+        "user_negative_cache": {
+            **negative_cache_stats,
+            "ttl": USER_NEGATIVE_CACHE_TTL
+        },
+        "redis_pool": {
+            "max_connections": REDIS_MAX_CONNECTIONS,
+            "in_use": len(redis_pool._in_use_connections),
+            "idle": len(redis_pool._available_connections)
+        },
+        "bcrypt": {
+            **bcrypt_stats,
+            "pool_size": BCRYPT_POOL_SIZE,
+            "max_queue": BCRYPT_MAX_QUEUE
+        }
+    }
+
+if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
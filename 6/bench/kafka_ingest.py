@@ -0,0 +1,92 @@
+"""Нагрузочный тест приема задач через Kafka.
+
+Публикует в топик заданное число синтетических задач (ключ — creator_id, как в
+task_service) и ждет, пока группа task_consumer закоммитит все оффсеты.
+Печатает пропускную способность приема в сообщениях в секунду.
+
+Пример:
+    docker compose run --rm task-consumer python bench/kafka_ingest.py --messages 100000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from confluent_kafka import Consumer, Producer, TopicPartition
+
+def consumer_lag(monitor: Consumer, topic: str) -> int:
+    metadata = monitor.list_topics(topic, timeout=10)
+    partitions = [TopicPartition(topic, p) for p in metadata.topics[topic].partitions]
+    lag = 0
+    for tp in monitor.committed(partitions, timeout=10):
+        low, high = monitor.get_watermark_offsets(tp, timeout=10)
+        committed = tp.offset if tp.offset >= 0 else low
+        lag += max(high - committed, 0)
+    return lag
+
+def make_task(creator_id: int) -> dict:
+    _id = ObjectId()
+    now = datetime.utcnow().isoformat()
+    return {
+        "task_id": str(_id),
+        "title": f"Load test task {_id}",
+        "description": "Synthetic task from bench/kafka_ingest.py",
+        "priority": random.choice(["low", "medium", "high"]),
+        "status": "todo",
+        "created_at": now,
+        "updated_at": now,
+        "creator_id": creator_id
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bootstrap", default="kafka:9092")
+    parser.add_argument("--topic", default="tasks")
+    parser.add_argument("--group", default="task_consumer")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--creators", type=int, default=1000, help="Число разных creator_id (ключей партиционирования)")
+    parser.add_argument("--timeout", type=float, default=600, help="Сколько максимум ждать, пока консьюмер догонит, с")
+    args = parser.parse_args()
+
+    producer = Producer({
+        'bootstrap.servers': args.bootstrap,
+        'linger.ms': 20,
+        'compression.type': 'lz4',
+        'enable.idempotence': True
+    })
+    monitor = Consumer({'bootstrap.servers': args.bootstrap, 'group.id': args.group})
+
+    initial_lag = consumer_lag(monitor, args.topic)
+    if initial_lag:
+        print(f"Warning: group {args.group} already lags by {initial_lag} messages")
+
+    started = time.monotonic()
+    for _ in range(args.messages):
+        creator_id = random.randint(1, args.creators)
+        payload = json.dumps(make_task(creator_id)).encode("utf-8")
+        while True:
+            try:
+                producer.produce(args.topic, payload, key=str(creator_id))
+                break
+            except BufferError:
+                producer.poll(0.1)
+        producer.poll(0)
+    producer.flush()
+    produced = time.monotonic() - started
+
+    lag = consumer_lag(monitor, args.topic)
+    while lag > 0:
+        if time.monotonic() - started > args.timeout:
+            raise SystemExit(f"Consumer did not catch up in {args.timeout} s, lag {lag}")
+        time.sleep(0.5)
+        lag = consumer_lag(monitor, args.topic)
+    elapsed = time.monotonic() - started
+    monitor.close()
+
+    print(f"Produced {args.messages} messages in {produced:.2f} s")
+    print(f"Ingested {args.messages} messages in {elapsed:.2f} s: {args.messages / elapsed:.0f} msg/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""Нагрузочный тест всех основных endpoint'ов с результатами в JSON.
+
+Наполняет стенд пользователями и задачами (--users, --tasks-per-user), затем
+по очереди гоняет сценарии с --concurrency параллельными клиентами по
+--duration секунд. Результат — JSON с числом запросов, пропускной способностью,
+кодами ответов и перцентилями задержки по каждому сценарию и каждой операции.
+С --baseline результат сравнивается с сохраненным прогоном: если пропускная
+способность упала или p95 вырос больше чем на --tolerance, скрипт завершается
+с кодом 1. Рост доли ошибок больше чем на 1% тоже считается регрессией.
+
+Режимы кэша: warm — перед замером идет прогрев, cold — перед каждым сценарием
+из Redis удаляются ключи user:* и task:* и прогрева нет (локальные кэши
+процессов при этом остаются).
+
+Пример (внутри сети compose; результаты и baseline остаются в каталоге 6/):
+    docker compose run --rm -v "$PWD:/app" task-service python -m bench.loadtest \\
+        --users 20 --tasks-per-user 200 --concurrency 50 --duration 30 \\
+        --baseline bench/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import httpx
+import redis.asyncio as aioredis
+
+AUTH_URL = os.getenv("AUTH_URL", "http://auth-service:8000")
+TASKS_URL = os.getenv("TASKS_URL", "http://task-service:8001")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+PASSWORD = "loadtest-password"
+BATCH_SIZE = 500
+# Регистрация и логин упираются в пул bcrypt — не засыпаем его запросами при наполнении
+SEED_CONCURRENCY = 8
+PERCENTILES = (50, 90, 95, 99)
+ERROR_RATE_TOLERANCE = 0.01
+
+# Веса операций в смешанной нагрузке: в основном чтение
+MIXED_WEIGHTS = {
+    "task_list": 35,
+    "task_get": 30,
+    "users_me": 10,
+    "task_create": 10,
+    "task_update": 10,
+    "login": 5
+}
+
+class SeededUser:
+    def __init__(self, username: str, token: str, task_ids: List[str]):
+        self.username = username
+        self.token = token
+        self.task_ids = task_ids
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+# Каждая операция — один HTTP-запрос от имени пользователя
+def login(client: httpx.AsyncClient, user: SeededUser):
+    return client.post(f"{AUTH_URL}/auth/token", data={"username": user.username, "password": PASSWORD})
+
+def users_me(client: httpx.AsyncClient, user: SeededUser):
+    return client.get(f"{AUTH_URL}/auth/users/me", headers=user.headers)
+
+def task_create(client: httpx.AsyncClient, user: SeededUser):
+    return client.post(
+        f"{TASKS_URL}/tasks/",
+        json={"title": "Load test task", "description": "Created by bench/loadtest.py", "priority": "medium"},
+        headers=user.headers
+    )
+
+def task_list(client: httpx.AsyncClient, user: SeededUser):
+    return client.get(f"{TASKS_URL}/tasks/", params={"limit": 50}, headers=user.headers)
+
+def task_get(client: httpx.AsyncClient, user: SeededUser):
+    return client.get(f"{TASKS_URL}/tasks/{random.choice(user.task_ids)}", headers=user.headers)
+
+def task_update(client: httpx.AsyncClient, user: SeededUser):
+    return client.put(
+        f"{TASKS_URL}/tasks/{random.choice(user.task_ids)}",
+        json={"status": random.choice(["todo", "in_progress", "done"])},
+        headers=user.headers
+    )
+
+OPERATIONS: Dict[str, Callable] = {
+    "login": login,
+    "users_me": users_me,
+    "task_create": task_create,
+    "task_list": task_list,
+    "task_get": task_get,
+    "task_update": task_update
+}
+
+# Сценарий — набор операций с весами
+SCENARIOS: Dict[str, Dict[str, int]] = {
+    **{name: {name: 1} for name in OPERATIONS},
+    "mixed": MIXED_WEIGHTS
+}
+
+async def get_token(client: httpx.AsyncClient, username: str) -> str:
+    response = await client.post(f"{AUTH_URL}/auth/token", data={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def exported_task_ids(client: httpx.AsyncClient, token: str) -> List[str]:
+    # Выгрузка читает только MongoDB — по ней видно, что task_consumer записал задачи
+    response = await client.get(f"{TASKS_URL}/tasks/export", headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+    return [json.loads(line)["task_id"] for line in response.text.splitlines() if line]
+
+async def seed_user(client: httpx.AsyncClient, index: int, tasks_per_user: int) -> SeededUser:
+    username = f"loadtest_user_{index}"
+    response = await client.post(
+        f"{AUTH_URL}/auth/users/",
+        json={"username": username, "password": PASSWORD, "full_name": f"Load Test {index}"}
+    )
+    if response.status_code not in (200, 400):
+        response.raise_for_status()
+    token = await get_token(client, username)
+
+    # Повторный запуск досоздает только недостающие задачи
+    task_ids = await exported_task_ids(client, token)
+    missing = tasks_per_user - len(task_ids)
+    for start in range(0, max(missing, 0), BATCH_SIZE):
+        tasks = [
+            {
+                "title": f"Seed task {start + i}",
+                "description": "Seeded by bench/loadtest.py",
+                "priority": random.choice(["low", "medium", "high"])
+            }
+            for i in range(min(BATCH_SIZE, missing - start))
+        ]
+        response = await client.post(
+            f"{TASKS_URL}/tasks/batch",
+            params={"wait_for_ack": "true"},
+            json=tasks,
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+    return SeededUser(username, token, task_ids)
+
+async def seed(client: httpx.AsyncClient, users: int, tasks_per_user: int, timeout: float) -> List[SeededUser]:
+    semaphore = asyncio.Semaphore(SEED_CONCURRENCY)
+
+    async def seed_one(index: int) -> SeededUser:
+        async with semaphore:
+            return await seed_user(client, index, tasks_per_user)
+
+    seeded = await asyncio.gather(*(seed_one(i) for i in range(users)))
+    # Ждем, пока task_consumer запишет все задачи в MongoDB
+    deadline = time.monotonic() + timeout
+    for user in seeded:
+        while len(user.task_ids) < tasks_per_user:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{user.username}: only {len(user.task_ids)} of {tasks_per_user} tasks persisted")
+            await asyncio.sleep(1)
+            user.task_ids = await exported_task_ids(client, user.token)
+    return seeded
+
+async def drop_redis_caches():
+    client = aioredis.Redis.from_url(REDIS_URL)
+    try:
+        for pattern in ("user:*", "task:*"):
+            keys = [key async for key in client.scan_iter(match=pattern, count=1000)]
+            for start in range(0, len(keys), 1000):
+                await client.delete(*keys[start:start + 1000])
+    finally:
+        await client.aclose()
+
+def summarize(latencies: List[float], statuses: Dict[str, int], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    result = {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": count / elapsed if elapsed else 0.0,
+        "status_codes": dict(sorted(statuses.items())),
+        "latency_ms": {}
+    }
+    if count:
+        for p in PERCENTILES:
+            result["latency_ms"][f"p{p}"] = latencies[min(count - 1, int(count * p / 100))] * 1000
+        result["latency_ms"]["mean"] = statistics.mean(latencies) * 1000
+        result["latency_ms"]["max"] = latencies[-1] * 1000
+    return result
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    users: List[SeededUser],
+    weights: Dict[str, int],
+    concurrency: int,
+    duration: float
+) -> dict:
+    names = list(weights)
+    samples: Dict[str, List[float]] = {name: [] for name in names}
+    statuses: Dict[str, Dict[str, int]] = {name: {} for name in names}
+    errors = {name: 0 for name in names}
+    deadline = time.monotonic() + duration
+
+    async def virtual_user(user: SeededUser):
+        while time.monotonic() < deadline:
+            name = random.choices(names, weights=[weights[n] for n in names])[0]
+            started = time.perf_counter()
+            try:
+                response = await OPERATIONS[name](client, user)
+                code = str(response.status_code)
+                failed = response.status_code >= 400
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+                failed = True
+            samples[name].append(time.perf_counter() - started)
+            statuses[name][code] = statuses[name].get(code, 0) + 1
+            errors[name] += failed
+
+    started = time.monotonic()
+    await asyncio.gather(*(virtual_user(users[i % len(users)]) for i in range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    all_statuses: Dict[str, int] = {}
+    for per_operation in statuses.values():
+        for code, count in per_operation.items():
+            all_statuses[code] = all_statuses.get(code, 0) + count
+    result = summarize(
+        [sample for name in names for sample in samples[name]], all_statuses, sum(errors.values()), elapsed
+    )
+    if len(names) > 1:
+        result["operations"] = {
+            name: summarize(samples[name], statuses[name], errors[name], elapsed) for name in names
+        }
+    return result
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    for key in ("users", "tasks_per_user", "concurrency", "duration", "cache_mode"):
+        if results["meta"].get(key) != baseline.get("meta", {}).get(key):
+            print(f"Warning: {key} differs from baseline ({results['meta'].get(key)} vs {baseline['meta'].get(key)})")
+    print(f"{'scenario':14} {'rps':>10} {'base rps':>10} {'p95 ms':>10} {'base p95':>10}")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or not current["requests"] or not previous["requests"]:
+            continue
+        rps, base_rps = current["throughput_rps"], previous["throughput_rps"]
+        p95, base_p95 = current["latency_ms"]["p95"], previous["latency_ms"]["p95"]
+        marks = []
+        if rps < base_rps * (1 - tolerance):
+            marks.append("throughput")
+        if p95 > base_p95 * (1 + tolerance):
+            marks.append("p95")
+        # Доля ошибок сравнивается по абсолютной разнице: в baseline она обычно нулевая
+        error_rate = current["errors"] / current["requests"]
+        if error_rate > previous["errors"] / previous["requests"] + ERROR_RATE_TOLERANCE:
+            marks.append("errors")
+        print(f"{name:14} {rps:10.1f} {base_rps:10.1f} {p95:10.2f} {base_p95:10.2f}  {' '.join(marks)}")
+        if marks:
+            regressions.append(f"{name}: {', '.join(marks)}")
+    return regressions
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Сценарии через запятую")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--tasks-per-user", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5, help="Прогрев перед сценарием в режиме warm, с")
+    parser.add_argument("--cache-mode", choices=("warm", "cold"), default="warm")
+    parser.add_argument("--seed-timeout", type=float, default=300)
+    parser.add_argument("--output", help="Файл результата (по умолчанию results/loadtest-<время>.json)")
+    parser.add_argument("--baseline", help="Сравнить с сохраненным результатом")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Допустимое ухудшение, доля")
+    parser.add_argument("--update-baseline", action="store_true", help="Записать результат в --baseline")
+    args = parser.parse_args()
+
+    if args.users < 1 or args.tasks_per_user < 1:
+        parser.error("--users and --tasks-per-user must be positive")
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        started = time.monotonic()
+        users = await seed(client, args.users, args.tasks_per_user, args.seed_timeout)
+        print(f"Seeded {len(users)} users x {args.tasks_per_user} tasks in {time.monotonic() - started:.1f}s")
+
+        results = {
+            "meta": {
+                "started_at": datetime.utcnow().isoformat(),
+                "users": args.users,
+                "tasks_per_user": args.tasks_per_user,
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "cache_mode": args.cache_mode
+            },
+            "scenarios": {}
+        }
+        for name in scenarios:
+            if args.cache_mode == "cold":
+                await drop_redis_caches()
+            elif args.warmup > 0:
+                await run_scenario(client, users, SCENARIOS[name], args.concurrency, args.warmup)
+            result = await run_scenario(client, users, SCENARIOS[name], args.concurrency, args.duration)
+            results["scenarios"][name] = result
+            latency = result["latency_ms"]
+            print(
+                f"{name:14} {result['throughput_rps']:9.1f} req/s  errors {result['errors']:6}  "
+                f"p50 {latency.get('p50', 0):8.2f} ms  p95 {latency.get('p95', 0):8.2f} ms  "
+                f"p99 {latency.get('p99', 0):8.2f} ms"
+            )
+
+    output = Path(args.output or f"results/loadtest-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Results written to {output}")
+
+    if not args.baseline:
+        return 0
+    baseline_path = Path(args.baseline)
+    if args.update_baseline or not baseline_path.exists():
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"Baseline written to {baseline_path}")
+        return 0
+    regressions = compare(results, json.loads(baseline_path.read_text()), args.tolerance)
+    if regressions:
+        print(f"Regressions against {baseline_path}: {'; '.join(regressions)}")
+        return 1
+    print(f"No regressions against {baseline_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
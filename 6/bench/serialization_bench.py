@@ -0,0 +1,105 @@
+"""Микробенчмарк сериализации ответа GET /tasks/: модель Task против orjson.
+
+Старый путь: Task(**doc) для каждого документа, затем повторная валидация
+response_model=List[Task] внутри FastAPI и json.dumps в JSONResponse. Новый путь:
+task_json(doc) и ORJSONResponse. Базы не нужны — документы генерируются в памяти.
+Перед замером проверяется, что оба пути отдают одинаковые байты.
+
+Пример:
+    docker compose run --rm task-service python -m bench.serialization_bench --tasks 1000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from task_service.main import Task, task_json
+
+RESPONSE_FIELD = create_response_field(name="Response_read_tasks", type_=List[Task])
+
+def task_from_doc(doc: dict) -> Task:
+    # Прежнее преобразование документа в модель Task, которое сервис делал до перехода на task_json
+    doc["task_id"] = str(doc.pop("_id"))
+    if isinstance(doc.get("due_date"), datetime):
+        doc["due_date"] = doc["due_date"].strftime("%Y-%m-%d")
+    return Task(**doc)
+
+def make_docs(count: int) -> List[dict]:
+    # Документы в том виде, в каком их возвращает motor: naive datetime с точностью до мс
+    now = datetime.utcnow().replace(microsecond=random.randrange(1000) * 1000)
+    docs = []
+    for i in range(count):
+        updated_at = now - timedelta(minutes=i)
+        docs.append({
+            "_id": ObjectId(),
+            "title": f"Задача {i}",
+            "description": "Описание задачи для нагрузочного теста " * 3,
+            "status": random.choice(["todo", "in_progress", "done", "cancelled"]),
+            "priority": random.choice(["low", "medium", "high"]),
+            "created_at": updated_at - timedelta(days=1),
+            "updated_at": updated_at,
+            "due_date": "2025-12-31" if i % 3 else None,
+            "assignee_id": i % 50 if i % 2 else None,
+            "creator_id": 1,
+            "version": i % 5
+        })
+    return docs
+
+async def old_path(docs: List[dict]) -> bytes:
+    tasks = [task_from_doc(dict(doc)) for doc in docs]
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=tasks, is_coroutine=True)
+    return JSONResponse(content).body
+
+async def new_path(docs: List[dict]) -> bytes:
+    return ORJSONResponse([task_json(doc) for doc in docs]).body
+
+async def measure(path, docs: List[dict], iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.process_time()
+        await path(docs)
+        samples.append(time.process_time() - started)
+    return samples
+
+def report(name: str, samples: List[float], tasks: int):
+    per_thousand = [sample * 1000 / tasks * 1000 for sample in samples]
+    print(
+        f"{name:22} CPU per 1000 tasks: mean {statistics.mean(per_thousand):7.3f} ms  "
+        f"p50 {statistics.median(per_thousand):7.3f} ms  min {min(per_thousand):7.3f} ms"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+
+    docs = make_docs(args.tasks)
+    old_body, new_body = await old_path(docs), await new_path(docs)
+    if old_body != new_body:
+        print("Wire format differs:")
+        print(old_body[:300])
+        print(new_body[:300])
+        sys.exit(1)
+
+    await measure(old_path, docs, args.warmup)
+    await measure(new_path, docs, args.warmup)
+    old_samples = await measure(old_path, docs, args.iterations)
+    new_samples = await measure(new_path, docs, args.iterations)
+
+    report("Task + response_model", old_samples, args.tasks)
+    report("task_json + orjson", new_samples, args.tasks)
+    print(f"speedup (mean): {statistics.mean(old_samples) / statistics.mean(new_samples):.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+-- POST /auth/token с логином и паролем из USERNAME и PASSWORD (по умолчанию admin/secret)
+-- Пример: wrk -t4 -c50 -d30s -s bench/wrk/login.lua http://localhost:8000/auth/token
+
+local username = os.getenv("USERNAME") or "admin"
+local password = os.getenv("PASSWORD") or "secret"
+
+wrk.method = "POST"
+wrk.body = "username=" .. username .. "&password=" .. password
+wrk.headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+-- Каждый поток wrk считает ответы 503 отдельно, в done их суммируем
+local threads = {}
+
+function setup(thread)
+    table.insert(threads, thread)
+end
+
+function init(args)
+    rejected = 0
+end
+
+function response(status, headers, body)
+    if status == 503 then
+        rejected = rejected + 1
+    end
+end
+
+function done(summary, latency, requests)
+    local total = 0
+    for _, thread in ipairs(threads) do
+        total = total + thread:get("rejected")
+    end
+    io.write(string.format("503 responses: %d\n", total))
+end
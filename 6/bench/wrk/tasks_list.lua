@@ -0,0 +1,10 @@
+-- GET /tasks/ с токеном из переменной окружения TOKEN
+-- Пример: TOKEN=<jwt> wrk -t10 -c100 -d30s -s bench/wrk/tasks_list.lua http://localhost:8001/tasks/
+
+local token = os.getenv("TOKEN")
+if token == nil then
+    error("TOKEN environment variable is required")
+end
+
+wrk.method = "GET"
+wrk.headers["Authorization"] = "Bearer " .. token
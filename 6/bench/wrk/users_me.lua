@@ -0,0 +1,10 @@
+-- GET /auth/users/me с токеном из переменной окружения TOKEN
+-- Пример: TOKEN=<jwt> wrk -t10 -c100 -d30s -s bench/wrk/users_me.lua http://localhost:8000/auth/users/me
+
+local token = os.getenv("TOKEN")
+if token == nil then
+    error("TOKEN environment variable is required")
+end
+
+wrk.method = "GET"
+wrk.headers["Authorization"] = "Bearer " .. token
@@ -0,0 +1,51 @@
+"""Настройки gunicorn для auth_service и task_service.
+
+Порт и приложение задаются в CMD образа, например:
+    gunicorn -c gunicorn.conf.py --bind 0.0.0.0:8001 task_service.main:app
+
+Плавный перезапуск воркеров (новые поднимаются до остановки старых):
+    docker compose kill -s HUP task-service
+"""
+import multiprocessing
+import os
+import shutil
+
+# UvicornWorker с loop="auto" и http="auto" берет uvloop и httptools, только если они
+# установлены; импортируем их здесь, чтобы образ без них не запустился молча на asyncio/h11
+import httptools  # noqa: F401
+import uvloop  # noqa: F401
+from prometheus_client import multiprocess
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+# Воркеры наследуют окружение арбитра: по WEB_CONCURRENCY сервис делит ядра между процессами
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Приложение импортируется в каждом воркере после fork, а клиенты PostgreSQL, MongoDB,
+# Redis и Kafka создаются в lifespan воркера — между процессами ничего не разделяется
+preload_app = False
+
+# Воркер, не отвечающий арбитру дольше timeout секунд, перезапускается
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+# По SIGTERM и SIGHUP воркер дорабатывает текущие запросы и закрывает клиенты в lifespan
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Плановый перезапуск воркера после max_requests запросов; 0 — выключено
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+# Метрики Prometheus: каждый воркер пишет значения в файлы PROMETHEUS_MULTIPROC_DIR,
+# /metrics любого воркера собирает их со всех процессов. Файлы создаются уже при импорте
+# модуля сервиса, поэтому сервисы, запущенные без gunicorn, создают каталог сами
+# (os.makedirs(..., exist_ok=True) перед определением метрик), но не очищают его
+def on_starting(server):
+    # Файлы прошлого запуска сложились бы с новыми значениями: pid в контейнере повторяются
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+def child_exit(server, worker):
+    # Gauge умершего воркера больше не учитываются; счетчики и гистограммы сохраняются
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
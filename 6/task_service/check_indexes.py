@@ -0,0 +1,82 @@
+"""Проверка, что все запросы task_service к коллекции tasks идут по индексам.
+
+Создает индексы из TASK_INDEXES, выполняет explain() для каждой формы запроса
+сервиса и завершается с кодом 1, если хотя бы в одном плане есть COLLSCAN.
+
+Запуск (из каталога 6/, при поднятом стенде):
+    docker compose run --rm task-service python -m task_service.check_indexes
+"""
+import sys
+from datetime import date, datetime
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+from task_service.main import (
+    MONGODB_URL,
+    TASK_INDEXES,
+    TASKS_SORT,
+    Priority,
+    TaskStatus,
+    owner_filter,
+    task_batch_filter,
+    task_update_filter,
+    tasks_page_filter,
+)
+
+USER_ID = 1
+TASK_ID = ObjectId()
+CURSOR = (datetime.utcnow(), ObjectId())
+
+# (название, фильтр, сортировка) — по одному на каждый запрос в task_service/main.py
+QUERY_SHAPES = [
+    ("read_tasks", tasks_page_filter(USER_ID), TASKS_SORT),
+    ("read_tasks: next page", tasks_page_filter(USER_ID, after=CURSOR), TASKS_SORT),
+    (
+        "read_tasks: all filters",
+        tasks_page_filter(
+            USER_ID, TaskStatus.TODO, Priority.HIGH, date(2025, 1, 1), date(2025, 12, 31), CURSOR
+        ),
+        TASKS_SORT,
+    ),
+    ("export_tasks", tasks_page_filter(USER_ID, TaskStatus.DONE), TASKS_SORT),
+    ("read_task", owner_filter(USER_ID, _id=TASK_ID), None),
+    ("read_tasks: ids", owner_filter(USER_ID, _id={"$in": [TASK_ID, ObjectId()]}), None),
+    ("update_task", task_update_filter(TASK_ID, USER_ID, expected_version=3), None),
+    ("update_tasks_batch: read", task_batch_filter([TASK_ID, ObjectId()], USER_ID), None),
+    ("update_tasks_batch: recheck", {"_id": {"$in": [TASK_ID, ObjectId()]}}, None),
+]
+
+def stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from stages(child)
+
+def main() -> int:
+    client = MongoClient(MONGODB_URL)
+    collection = client.task_tracker.tasks
+    collection.create_indexes(TASK_INDEXES)
+
+    failed = []
+    for name, query, sort in QUERY_SHAPES:
+        cursor = collection.find(query).limit(51)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        plan_stages = [stage for stage in stages(plan) if stage]
+        verdict = "COLLSCAN" if "COLLSCAN" in plan_stages else "ok"
+        print(f"{verdict:8} {name}: {' <- '.join(plan_stages)}")
+        if verdict == "COLLSCAN":
+            failed.append(name)
+    client.close()
+
+    if failed:
+        print(f"Queries without index: {', '.join(failed)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())